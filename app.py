@@ -1,7 +1,9 @@
 import streamlit as st
 import os
+import shutil
 from pathlib import Path
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
 from rag_pipeline import RAGPipeline
@@ -14,15 +16,28 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Only the most recent chat messages are rendered on each rerun
+MAX_RENDERED_MESSAGES = 20
+
+@st.cache_resource
+def get_vector_store():
+    """Vector store shared by all sessions in this process."""
+    return VectorStore()
+
+@st.cache_resource
+def get_document_processor():
+    """Document processor shared by all sessions in this process."""
+    return DocumentProcessor()
+
 # Initialize session state
 if 'vector_store' not in st.session_state:
-    st.session_state.vector_store = VectorStore()
+    st.session_state.vector_store = get_vector_store()
 
 if 'rag_pipeline' not in st.session_state:
     st.session_state.rag_pipeline = None
 
 if 'document_processor' not in st.session_state:
-    st.session_state.document_processor = DocumentProcessor()
+    st.session_state.document_processor = get_document_processor()
 
 if 'messages' not in st.session_state:
     st.session_state.messages = []
@@ -40,6 +55,29 @@ def format_time(seconds):
     else:
         return f"{seconds:.2f}s"
 
+def trim_old_sources():
+    """Keep only source metadata and ids on messages outside the rendered window."""
+    for message in st.session_state.messages[:-MAX_RENDERED_MESSAGES]:
+        if message.get("sources"):
+            # doc_id is kept so full text can still be loaded on demand
+            message["sources"] = [
+                {"metadata": source["metadata"], "doc_id": source.get("doc_id")}
+                for source in message["sources"][:2]
+            ]
+
+def render_sources(sources, key_prefix):
+    """Show source snippets, loading full content only when requested."""
+    for idx, source in enumerate(sources):
+        st.markdown(f"**From:** {source['metadata'].get('source', 'Unknown')}")
+        if "snippet" in source:
+            st.markdown(f"**Content:** {source['snippet']}")
+        if source.get("doc_id") and st.button("Show full text", key=f"{key_prefix}_source_{idx}"):
+            document = st.session_state.vector_store.get_document(source["doc_id"])
+            if document:
+                st.markdown(document.page_content)
+            else:
+                st.info("Source is no longer available")
+
 def initialize_rag_pipeline():
     """Initialize the RAG pipeline if vector store has documents."""
     if st.session_state.vector_store.get_store_info()["count"] > 0:
@@ -60,27 +98,42 @@ def process_uploaded_files(uploaded_files):
     progress_bar = st.progress(0)
     status_text = st.empty()
     
-    all_documents = []
-    
-    for idx, uploaded_file in enumerate(uploaded_files):
-        status_text.text(f"Processing {uploaded_file.name}...")
-        
-        # Save uploaded file
+    # Save uploaded files
+    os.makedirs("uploads", exist_ok=True)
+    file_paths = []
+    for uploaded_file in uploaded_files:
         file_path = os.path.join("uploads", uploaded_file.name)
-        os.makedirs("uploads", exist_ok=True)
-        
+        uploaded_file.seek(0)
         with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        # Process file
-        documents = st.session_state.document_processor.process_file(file_path)
-        all_documents.extend(documents)
-        
-        progress_bar.progress((idx + 1) / len(uploaded_files))
+            shutil.copyfileobj(uploaded_file, f, 1024 * 1024)
+        file_paths.append(file_path)
+    
+    # Process files in parallel; results are kept in upload order
+    status_text.text(f"Processing {len(file_paths)} files...")
+    results = [None] * len(file_paths)
+    processor = st.session_state.document_processor
+    with ThreadPoolExecutor(max_workers=min(8, len(file_paths))) as executor:
+        futures = {
+            executor.submit(processor.process_file, file_path): idx
+            for idx, file_path in enumerate(file_paths)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            idx = futures[future]
+            results[idx] = future.result()
+            status_text.text(f"Processed {uploaded_files[idx].name}")
+            progress_bar.progress(done / len(file_paths))
+    
+    all_documents = [doc for documents in results for doc in documents]
     
     if all_documents:
         status_text.text("Creating vector store...")
-        st.session_state.vector_store.create_vector_store(all_documents)
+        try:
+            st.session_state.vector_store.create_vector_store(all_documents)
+        except Exception as e:
+            progress_bar.empty()
+            status_text.empty()
+            st.error(f"Error creating vector store: {e}")
+            return
         
         status_text.text("Initializing RAG pipeline...")
         initialize_rag_pipeline()
@@ -96,7 +149,6 @@ def clear_all_data():
     st.session_state.uploaded_files = []
     
     # Clear uploads directory
-    import shutil
     if os.path.exists("uploads"):
         shutil.rmtree("uploads")
     
@@ -122,6 +174,8 @@ with st.sidebar:
         store_info = st.session_state.vector_store.get_store_info()
         st.metric("Documents", store_info.get("count", 0))
         st.metric("Status", store_info.get("status", "unknown"))
+        if store_info.get("error"):
+            st.error(store_info["error"])
     
     # Clear data button
     if st.button("Clear All Data", type="secondary"):
@@ -159,8 +213,19 @@ with col1:
     # Chat interface
     st.subheader("💬 Chat")
     
-    # Display chat messages
-    for message in st.session_state.messages:
+    # Display chat messages, limited to the most recent ones unless requested
+    messages = st.session_state.messages
+    hidden_count = len(messages) - MAX_RENDERED_MESSAGES
+    if hidden_count > 0:
+        if not st.toggle(
+            "Show full history",
+            key="show_full_history",
+            help=f"{hidden_count} earlier messages are hidden"
+        ):
+            messages = messages[-MAX_RENDERED_MESSAGES:]
+    
+    first_index = len(st.session_state.messages) - len(messages)
+    for message_index, message in enumerate(messages, start=first_index):
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
             
@@ -178,9 +243,7 @@ with col1:
             
             if "sources" in message and message["sources"]:
                 with st.expander("View Sources"):
-                    for source in message["sources"]:
-                        st.markdown(f"**From:** {source['metadata'].get('source', 'Unknown')}")
-                        st.markdown(f"**Content:** {source['content']}")
+                    render_sources(message["sources"], f"message_{message_index}")
     
     # Chat input
     if st.session_state.rag_pipeline is None:
@@ -201,17 +264,28 @@ with col1:
                 with st.spinner("Thinking..."):
                     start_time = time.time()
                     
-                    # Track retrieval time
+                    # Track retrieval time; generation streams afterwards
                     retrieval_start = time.time()
-                    response = st.session_state.rag_pipeline.ask_question(prompt)
+                    response = st.session_state.rag_pipeline.stream_question(prompt)
                     retrieval_end = time.time()
                     
+                    # Generation errors surface while the stream is consumed
+                    if not response["error"]:
+                        try:
+                            streamed_answer = st.write_stream(response["answer_stream"])
+                        except Exception as e:
+                            response = {
+                                "answer": f"Error processing question: {str(e)}",
+                                "error": True
+                            }
+                    
                     if response["error"]:
                         st.error(response["answer"])
                         assistant_message = response["answer"]
                         sources = []
                         metrics = None
                     else:
+                        assistant_message = streamed_answer
                         end_time = time.time()
                         
                         # Calculate metrics
@@ -225,8 +299,6 @@ with col1:
                             "generation_time": generation_time
                         }
                         
-                        st.markdown(response["answer"])
-                        assistant_message = response["answer"]
                         sources = response["source_documents"]
                         
                         # Display performance metrics
@@ -241,9 +313,8 @@ with col1:
                         
                         if sources:
                             with st.expander("View Sources"):
-                                for source in sources:
-                                    st.markdown(f"**From:** {source['metadata'].get('source', 'Unknown')}")
-                                    st.markdown(f"**Content:** {source['content']}")
+                                # Same key as this message gets in the history on rerun
+                                render_sources(sources, f"message_{len(st.session_state.messages)}")
             
             # Add assistant message to history
             st.session_state.messages.append({
@@ -252,6 +323,7 @@ with col1:
                 "sources": sources,
                 "metrics": metrics
             })
+            trim_old_sources()
 
 with col2:
     st.subheader("📊 Chat History")
@@ -283,17 +355,25 @@ with col2:
                 import time
                 
                 with st.spinner("Running performance test..."):
-                    # Test retrieval speed
+                    # Time embedding and search separately, bypassing the query cache
                     test_query = "test query"
                     start_time = time.time()
-                    _ = st.session_state.vector_store.similarity_search(test_query, k=3)
+                    query_embedding = st.session_state.vector_store.embeddings.embed_query(test_query)
+                    embedding_test_time = time.time() - start_time
+                    
+                    start_time = time.time()
+                    _ = st.session_state.vector_store.search_by_vector(query_embedding, k=3)
                     retrieval_test_time = time.time() - start_time
                     
+                    st.write(f"**Embedding Speed**: {format_time(embedding_test_time)} per query")
                     st.write(f"**Retrieval Speed**: {format_time(retrieval_test_time)} for 3 documents")
         except Exception as e:
             st.error("Could not load system info")
 
 # Initialize system on startup
 if st.session_state.rag_pipeline is None:
-    st.session_state.vector_store.load_existing_store()
+    # Don't retry a store that was refused until the data is cleared
+    store = st.session_state.vector_store
+    if store.vector_store is None and not store.load_error:
+        store.load_existing_store()
     initialize_rag_pipeline()
\ No newline at end of file
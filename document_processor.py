@@ -1,12 +1,44 @@
+import hashlib
 import os
-from typing import List, Dict
+import pickle
+import re
+import threading
+from typing import List, Dict, Optional
 from pathlib import Path
 import pypdf
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
+# PyMuPDF extracts text much faster than pypdf; fall back if it is missing.
+# It is optional (AGPL-licensed) and not safe to use from several threads.
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+_pymupdf_lock = threading.Lock()
+
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    # Bump when chunking changes so cached chunks are rebuilt
+    SPLITTER_VERSION = 1
+    
+    # File extension -> (metadata type label, display name)
+    SUPPORTED_TYPES = {
+        '.pdf': ("pdf", "PDF"),
+        '.txt': ("txt", "TXT"),
+        '.md': ("markdown", "Markdown")
+    }
+    
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        cache_dir: Optional[str] = "uploads/.cache"
+    ):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.cache_dir = cache_dir
+        self._para_re = re.compile(r"\n\n+")
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
@@ -14,104 +46,148 @@ class DocumentProcessor:
             separators=["\n\n", "\n", " ", ""]
         )
     
-    def load_pdf(self, file_path: str) -> List[Document]:
-        """Load and process PDF files."""
-        documents = []
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = pypdf.PdfReader(file)
-                text = ""
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text += page.extract_text() + "\n"
-                
-                # Split into chunks
-                chunks = self.text_splitter.split_text(text)
-                
-                for i, chunk in enumerate(chunks):
-                    documents.append(Document(
-                        page_content=chunk,
-                        metadata={
-                            "source": file_path,
-                            "type": "pdf",
-                            "chunk": i,
-                            "total_chunks": len(chunks)
-                        }
-                    ))
-        except Exception as e:
-            print(f"Error loading PDF {file_path}: {str(e)}")
+    def _fast_split(self, text: str) -> List[str]:
+        """Split text into chunks, grouping whole paragraphs where possible."""
+        chunks = []
+        current = []
+        current_len = 0
         
-        return documents
+        for para in self._para_re.split(text):
+            para = para.strip()
+            if not para:
+                continue
+            
+            # Oversized paragraphs go through the recursive splitter
+            if len(para) > self.chunk_size:
+                if current:
+                    chunks.append("\n\n".join(current))
+                    current, current_len = [], 0
+                chunks.extend(self.text_splitter.split_text(para))
+                continue
+            
+            if current and current_len + 2 + len(para) > self.chunk_size:
+                chunks.append("\n\n".join(current))
+                # Keep trailing paragraphs as overlap while they fit
+                while current and (
+                    current_len > self.chunk_overlap
+                    or current_len + 2 + len(para) > self.chunk_size
+                ):
+                    current_len -= len(current.pop(0)) + (2 if current else 0)
+            
+            current_len += len(para) + (2 if current else 0)
+            current.append(para)
+        
+        if current:
+            chunks.append("\n\n".join(current))
+        
+        return chunks
     
-    def load_txt(self, file_path: str) -> List[Document]:
-        """Load and process TXT files."""
-        documents = []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
-                
-                # Split into chunks
-                chunks = self.text_splitter.split_text(text)
-                
-                for i, chunk in enumerate(chunks):
-                    documents.append(Document(
-                        page_content=chunk,
-                        metadata={
-                            "source": file_path,
-                            "type": "txt",
-                            "chunk": i,
-                            "total_chunks": len(chunks)
-                        }
-                    ))
-        except Exception as e:
-            print(f"Error loading TXT {file_path}: {str(e)}")
+    def _read_pdf(self, file_path: str) -> str:
+        """Extract text from a PDF file."""
+        if pymupdf is not None:
+            # Serialize all PyMuPDF use; parallel callers take turns here
+            with _pymupdf_lock, pymupdf.open(file_path) as doc:
+                return "\n".join(page.get_text("text") for page in doc)
         
-        return documents
+        with open(file_path, 'rb') as file:
+            pdf_reader = pypdf.PdfReader(file)
+            # Join once instead of repeatedly concatenating page text
+            return "\n".join(page.extract_text() for page in pdf_reader.pages)
     
-    def load_md(self, file_path: str) -> List[Document]:
-        """Load and process Markdown files."""
-        documents = []
+    def _extract_text(self, file_path: str, file_extension: str) -> str:
+        """Extract raw text from a supported file."""
+        if file_extension == '.pdf':
+            return self._read_pdf(file_path)
+        
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return file.read()
+    
+    def _build_documents(self, text: str, file_path: str, type_label: str) -> List[Document]:
+        """Split text into chunks and wrap them as Documents."""
+        chunks = self._fast_split(text)
+        base_metadata = {
+            "source": file_path,
+            "type": type_label,
+            "total_chunks": len(chunks)
+        }
+        return [
+            Document(page_content=chunk, metadata={**base_metadata, "chunk": i})
+            for i, chunk in enumerate(chunks)
+        ]
+    
+    def _cache_path(self, file_path: str) -> Optional[Path]:
+        """Cache file for a file's chunks, keyed by its path, content, extractor and chunk settings."""
+        if self.cache_dir is None:
+            return None
+        
+        # Hash the content rather than mtime, since re-uploads rewrite the file
+        extractor = "pymupdf" if pymupdf is not None else "pypdf"
+        digest = hashlib.sha1(
+            f"{file_path}:{self.chunk_size}:{self.chunk_overlap}:"
+            f"{extractor}:{self.SPLITTER_VERSION}:".encode("utf-8")
+        )
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(block)
+        
+        return Path(self.cache_dir) / f"{digest.hexdigest()}.pkl"
+    
+    def _load_cached(self, cache_path: Optional[Path]) -> Optional[List[Document]]:
+        """Load cached chunks, if present."""
+        if cache_path is None or not cache_path.exists():
+            return None
+        
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
-                
-                # Split into chunks
-                chunks = self.text_splitter.split_text(text)
-                
-                for i, chunk in enumerate(chunks):
-                    documents.append(Document(
-                        page_content=chunk,
-                        metadata={
-                            "source": file_path,
-                            "type": "markdown",
-                            "chunk": i,
-                            "total_chunks": len(chunks)
-                        }
-                    ))
+            with open(cache_path, 'rb') as file:
+                return pickle.load(file)
         except Exception as e:
-            print(f"Error loading Markdown {file_path}: {str(e)}")
+            print(f"Error reading chunk cache {cache_path}: {str(e)}")
+            return None
+    
+    def _save_cached(self, cache_path: Optional[Path], documents: List[Document]) -> None:
+        """Write chunks to the cache atomically."""
+        if cache_path is None or not documents:
+            return
         
-        return documents
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as file:
+                pickle.dump(documents, file, protocol=5)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"Error writing chunk cache {cache_path}: {str(e)}")
     
     def process_file(self, file_path: str) -> List[Document]:
         """Process a file based on its extension."""
         file_extension = Path(file_path).suffix.lower()
         
-        if file_extension == '.pdf':
-            return self.load_pdf(file_path)
-        elif file_extension == '.txt':
-            return self.load_txt(file_path)
-        elif file_extension == '.md':
-            return self.load_md(file_path)
-        else:
+        if file_extension not in self.SUPPORTED_TYPES:
             print(f"Unsupported file type: {file_extension}")
             return []
+        
+        type_label, type_name = self.SUPPORTED_TYPES[file_extension]
+        try:
+            cache_path = self._cache_path(file_path)
+            documents = self._load_cached(cache_path)
+            if documents is not None:
+                return documents
+            
+            text = self._extract_text(file_path, file_extension)
+            documents = self._build_documents(text, file_path, type_label)
+        except Exception as e:
+            print(f"Error loading {type_name} {file_path}: {str(e)}")
+            return []
+        
+        self._save_cached(cache_path, documents)
+        return documents
     
     def process_directory(self, directory_path: str) -> List[Document]:
         """Process all supported files in a directory."""
         documents = []
         
         for file_path in Path(directory_path).glob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in ['.pdf', '.txt', '.md']:
+            if file_path.is_file() and file_path.suffix.lower() in self.SUPPORTED_TYPES:
                 print(f"Processing: {file_path}")
                 documents.extend(self.process_file(str(file_path)))
         
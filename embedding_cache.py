@@ -0,0 +1,60 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List
+import numpy as np
+
+class EmbeddingCache:
+    # Stay well below SQLite's limit on bound parameters per statement
+    _MAX_PARAMS = 500
+
+    def __init__(self, db_path: str = "./embed_cache.sqlite"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (hash BLOB PRIMARY KEY, vec BLOB)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> bytes:
+        """Hash a chunk together with the model that embeds it."""
+        return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Look up cached vectors, returning only the hits."""
+        hits = {}
+        with self._lock:
+            for start in range(0, len(keys), self._MAX_PARAMS):
+                batch = keys[start:start + self._MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM cache WHERE hash IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, vec in rows:
+                    hits[key] = np.frombuffer(vec, dtype=np.float32).tolist()
+        return hits
+
+    def put_many(self, items: Dict[bytes, List[float]]) -> None:
+        """Store vectors keyed by their chunk hash."""
+        if not items:
+            return
+
+        rows = [
+            (key, np.asarray(vec, dtype=np.float32).tobytes())
+            for key, vec in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (hash, vec) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Delete all cached vectors."""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
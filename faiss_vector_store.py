@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import sqlite3
+from typing import List, Optional
+import numpy as np
+from langchain.schema import Document
+from vector_store import VectorStore, synchronized
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+class FaissVectorStore(VectorStore):
+    def __init__(
+        self,
+        persist_directory: str = "./faiss_index",
+        hnsw_m: int = 32,
+        ef_search: int = 64,
+        **kwargs
+    ):
+        if faiss is None:
+            raise ImportError("FaissVectorStore requires faiss; install faiss-cpu")
+
+        super().__init__(persist_directory=persist_directory, **kwargs)
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.index_path = os.path.join(persist_directory, "index.faiss")
+        self.documents_path = os.path.join(persist_directory, "documents.sqlite")
+        self._db = None
+
+    @staticmethod
+    def _normalize(embeddings: List[List[float]]) -> np.ndarray:
+        """Normalize vectors so inner product equals cosine similarity."""
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _open_documents_db(self) -> None:
+        """Open the sidecar document database, creating it if needed."""
+        if self._db is not None:
+            return
+
+        os.makedirs(self.persist_directory, exist_ok=True)
+        self._db = sqlite3.connect(self.documents_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents "
+            "(id INTEGER PRIMARY KEY, content TEXT, metadata TEXT)"
+        )
+        self._db.commit()
+
+    @synchronized
+    def create_vector_store(self, documents: List[Document]) -> None:
+        """Create a new vector store from documents."""
+        if not documents:
+            print("No documents provided to create vector store")
+            return
+
+        # Append to the persisted index if there is one
+        if self.vector_store is None:
+            self.load_existing_store()
+        if self.load_error:
+            raise ValueError(self.load_error)
+        self._open_documents_db()
+
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            vectors = self._normalize(
+                self._embed_documents([doc.page_content for doc in batch])
+            )
+
+            if self.vector_store is None:
+                self.vector_store = faiss.IndexHNSWFlat(
+                    vectors.shape[1], self.hnsw_m, faiss.METRIC_INNER_PRODUCT
+                )
+                self.vector_store.hnsw.efSearch = self.ef_search
+
+            # HNSW indexes assign sequential ids, which key the sidecar rows
+            first_id = self.vector_store.ntotal
+            self.vector_store.add(vectors)
+            self._db.executemany(
+                "INSERT INTO documents (id, content, metadata) VALUES (?, ?, ?)",
+                [
+                    (first_id + i, doc.page_content, json.dumps(doc.metadata))
+                    for i, doc in enumerate(batch)
+                ]
+            )
+
+        self._db.commit()
+        faiss.write_index(self.vector_store, self.index_path)
+        self.query_cache.clear()
+        print(f"Vector store created with {len(documents)} document chunks")
+
+    @synchronized
+    def load_existing_store(self) -> bool:
+        """Load existing vector store if it exists."""
+        self.load_error = None
+        try:
+            if os.path.exists(self.index_path):
+                index = faiss.read_index(self.index_path)
+                if not self._check_dimension(index.d if index.ntotal else None):
+                    return False
+
+                self.vector_store = index
+                self.vector_store.hnsw.efSearch = self.ef_search
+                self._open_documents_db()
+                print("Loaded existing vector store")
+                return True
+        except Exception as e:
+            print(f"Error loading existing vector store: {e}")
+
+        return False
+
+    @synchronized
+    def search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """Search by embedding without the query cache."""
+        if self.vector_store is None or self.vector_store.ntotal == 0 or k <= 0:
+            return []
+
+        _, ids = self.vector_store.search(self._normalize([embedding]), k)
+        ids = [int(i) for i in ids[0] if i >= 0]
+        if not ids:
+            return []
+
+        placeholders = ",".join("?" * len(ids))
+        rows = self._db.execute(
+            f"SELECT id, content, metadata FROM documents WHERE id IN ({placeholders})",
+            ids
+        ).fetchall()
+        by_id = {
+            row_id: Document(id=str(row_id), page_content=content, metadata=json.loads(metadata))
+            for row_id, content, metadata in rows
+        }
+
+        return [by_id[i] for i in ids if i in by_id]
+
+    def get_document(self, doc_id: str) -> Optional[Document]:
+        """Fetch a single stored document by id."""
+        if self._db is None:
+            return None
+
+        row = self._db.execute(
+            "SELECT content, metadata FROM documents WHERE id = ?", (int(doc_id),)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return Document(id=doc_id, page_content=row[0], metadata=json.loads(row[1]))
+
+    def get_store_info(self) -> dict:
+        """Get information about the vector store."""
+        if self.load_error:
+            return {"status": "error", "count": 0, "error": self.load_error}
+        if self.vector_store is None:
+            return {"status": "not_initialized", "count": 0}
+
+        return {"status": "active", "count": self.vector_store.ntotal}
+
+    @synchronized
+    def clear_store(self) -> None:
+        """Clear the vector store."""
+        self.query_cache.clear()
+        self.embedding_cache.clear()
+        self.vector_store = None
+        self.load_error = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+        if os.path.exists(self.persist_directory):
+            shutil.rmtree(self.persist_directory)
+        print("Vector store cleared")
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import List, Optional
+import numpy as np
+from langchain.schema import Document
+
+class QueryCache:
+    def __init__(self, max_size: int = 512, ttl: float = 300.0, threshold: float = 0.97):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._entries = [None] * max_size
+        self._next = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector."""
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def get(self, embedding: List[float], k: int) -> Optional[List[Document]]:
+        """Return cached results for a near-identical query, if any."""
+        query = self._normalize(embedding)
+
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                return None
+
+            # Cosine similarity against every cached query in one matmul
+            scores = self._matrix @ query
+            now = time.time()
+            for idx in np.argsort(-scores):
+                if scores[idx] < self.threshold:
+                    break
+                entry = self._entries[idx]
+                if entry is None:
+                    continue
+                entry_k, docs, created = entry
+                if entry_k == k and now - created <= self.ttl:
+                    return list(docs)
+
+        return None
+
+    def put(self, embedding: List[float], k: int, docs: List[Document]) -> None:
+        """Store results for a query, evicting the oldest entry when full."""
+        query = self._normalize(embedding)
+
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                self._matrix = np.zeros((self.max_size, query.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.max_size
+                self._next = 0
+
+            self._matrix[self._next] = query
+            self._entries[self._next] = (k, list(docs), time.time())
+            self._next = (self._next + 1) % self.max_size
+
+    def clear(self) -> None:
+        """Drop all cached queries."""
+        with self._lock:
+            self._matrix = None
+            self._entries = [None] * self.max_size
+            self._next = 0
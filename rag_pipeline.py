@@ -1,16 +1,18 @@
-from typing import List, Dict, Optional
-from langchain.schema import Document
+import textwrap
+from typing import List, Dict, Iterator, Optional, Tuple
+from langchain.schema import Document, get_buffer_string
 from langchain.prompts import ChatPromptTemplate
 from langchain_community.llms import Ollama
 from langchain_community.chat_models import ChatOllama
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+from langchain_core.output_parsers import StrOutputParser
+from langchain.memory import ConversationBufferWindowMemory
 import json
 
 class RAGPipeline:
-    def __init__(self, vector_store, model_name: str = "mistral"):
+    def __init__(self, vector_store, model_name: str = "mistral", history_window: int = 6):
         self.vector_store = vector_store
         self.model_name = model_name
+        self.history_window = history_window
         self.llm = None
         self.memory = None
         self.qa_chain = None
@@ -29,8 +31,9 @@ class RAGPipeline:
             raise e
     
     def _setup_memory(self) -> None:
-        """Setup conversation memory."""
-        self.memory = ConversationBufferMemory(
+        """Setup conversation memory, keeping only the last few exchanges in the prompt."""
+        self.memory = ConversationBufferWindowMemory(
+            k=self.history_window,
             memory_key="chat_history",
             return_messages=True,
             output_key="answer"
@@ -59,20 +62,45 @@ Helpful Answer:"""
         PROMPT = ChatPromptTemplate.from_template(prompt_template)
         
         try:
-            self.qa_chain = ConversationalRetrievalChain.from_llm(
-                llm=self.llm,
-                retriever=self.vector_store.vector_store.as_retriever(
-                    search_kwargs={"k": 4}
-                ),
-                memory=self.memory,
-                return_source_documents=True,
-                combine_docs_chain_kwargs={"prompt": PROMPT}
-            )
+            # Retrieval is done in _prepare_inputs so the chain only generates
+            self.qa_chain = PROMPT | self.llm | StrOutputParser()
             print("QA chain setup complete")
         except Exception as e:
             print(f"Error setting up QA chain: {e}")
     
-    def ask_question(self, question: str) -> Dict[str, any]:
+    def _prepare_inputs(self, question: str, k: int = 4) -> Tuple[Dict[str, str], List[Document]]:
+        """Retrieve context and load chat history for a question."""
+        # Embed once and search by vector so the query cache applies
+        embedding = self.vector_store.embeddings.embed_query(question)
+        docs = self.vector_store.similarity_search_by_vector(embedding, k=k)
+        chat_history = get_buffer_string(
+            self.memory.load_memory_variables({})["chat_history"]
+        )
+        
+        inputs = {
+            "context": "\n\n".join(doc.page_content for doc in docs),
+            "chat_history": chat_history,
+            "question": question
+        }
+        return inputs, docs
+    
+    def _format_sources(self, docs: List[Document], snippet_len: int = 200) -> List[Dict[str, any]]:
+        """Extract source snippets; full content can be fetched later by doc_id."""
+        sources = []
+        for doc in docs:
+            snippet = textwrap.shorten(doc.page_content, snippet_len, placeholder="...")
+            # shorten() gives only the placeholder when the first word is too
+            # long (URLs, CJK, unbroken text); fall back to a plain slice
+            if snippet == "..." and doc.page_content.strip():
+                snippet = doc.page_content[:snippet_len] + "..."
+            sources.append({
+                "snippet": snippet,
+                "doc_id": getattr(doc, "id", None),
+                "metadata": doc.metadata
+            })
+        return sources
+    
+    def ask_question(self, question: str, k: int = 4, snippet_len: int = 200) -> Dict[str, any]:
         """Ask a question and get an answer with sources."""
         if self.qa_chain is None:
             return {
@@ -82,19 +110,13 @@ Helpful Answer:"""
             }
         
         try:
-            result = self.qa_chain({"question": question})
-            
-            # Extract source information
-            sources = []
-            for doc in result.get("source_documents", []):
-                sources.append({
-                    "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                    "metadata": doc.metadata
-                })
+            inputs, docs = self._prepare_inputs(question, k=k)
+            answer = self.qa_chain.invoke(inputs)
+            self.memory.save_context({"question": question}, {"answer": answer})
             
             return {
-                "answer": result["answer"],
-                "source_documents": sources,
+                "answer": answer,
+                "source_documents": self._format_sources(docs, snippet_len),
                 "error": False
             }
         except Exception as e:
@@ -104,6 +126,49 @@ Helpful Answer:"""
                 "error": True
             }
     
+    def stream_question(self, question: str, k: int = 4, snippet_len: int = 200) -> Dict[str, any]:
+        """Ask a question and get the answer as a token stream with sources.
+        
+        Retrieval happens before this returns; generation happens while
+        the caller consumes "answer_stream".
+        """
+        if self.qa_chain is None:
+            return {
+                "answer": "System not ready. Please upload documents first.",
+                "answer_stream": None,
+                "source_documents": [],
+                "error": True
+            }
+        
+        try:
+            inputs, docs = self._prepare_inputs(question, k=k)
+        except Exception as e:
+            return {
+                "answer": f"Error processing question: {str(e)}",
+                "answer_stream": None,
+                "source_documents": [],
+                "error": True
+            }
+        
+        return {
+            "answer": None,
+            "answer_stream": self._stream_answer(question, inputs),
+            "source_documents": self._format_sources(docs, snippet_len),
+            "error": False
+        }
+    
+    def _stream_answer(self, question: str, inputs: Dict[str, str]) -> Iterator[str]:
+        """Yield answer tokens and save the full answer to memory when done.
+        
+        Errors during generation propagate to the consumer of the stream.
+        """
+        parts = []
+        for token in self.qa_chain.stream(inputs):
+            parts.append(token)
+            yield token
+        
+        self.memory.save_context({"question": question}, {"answer": "".join(parts)})
+    
     def clear_memory(self) -> None:
         """Clear conversation memory."""
         if self.memory:
@@ -1,52 +1,201 @@
+import functools
 import os
+import threading
+import uuid
 from typing import List, Optional
+import numpy as np
 from langchain.schema import Document
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OllamaEmbeddings
+from langchain_ollama import OllamaEmbeddings
 from langchain_community.embeddings import SentenceTransformerEmbeddings
+from embedding_cache import EmbeddingCache
+from query_cache import QueryCache
+
+def synchronized(method):
+    """Serialize calls that modify the store, which may be shared across sessions."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class VectorStore:
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    # Above this size, searches go through Chroma's HNSW index instead of
+    # the in-memory corpus matrix
+    FAST_SEARCH_MAX_DOCS = 50000
+    
+    def __init__(
+        self,
+        persist_directory: str = "./chroma_db",
+        batch_size: int = 64,
+        embedding_cache_path: str = "./embed_cache.sqlite",
+        use_ollama_embeddings: bool = False
+    ):
         self.persist_directory = persist_directory
+        self.batch_size = batch_size
         self.vector_store = None
+        self.load_error = None
+        self._doc_count = 0
+        self._lock = threading.RLock()
+        self.query_cache = QueryCache()
+        self.embedding_cache = EmbeddingCache(embedding_cache_path)
         
-        # Try to use Ollama embeddings first, fallback to Sentence Transformers
-        try:
+        # Normalized embeddings and their documents, row-aligned. Only used
+        # while it holds the whole store, i.e. while _corpus_complete is set.
+        self._corpus = None
+        self._doc_refs = []
+        self._corpus_complete = True
+        
+        # Use compact, normalized Sentence Transformers embeddings by default;
+        # Ollama embeddings are opt-in or used as a fallback
+        if use_ollama_embeddings:
             self.embeddings = OllamaEmbeddings(model="mistral")
             print("Using Ollama embeddings with mistral")
-        except Exception as e:
-            print(f"Ollama embeddings not available, using Sentence Transformers: {e}")
-            self.embeddings = SentenceTransformerEmbeddings(
-                model_name="all-MiniLM-L6-v2"
-            )
+        else:
+            try:
+                self.embeddings = SentenceTransformerEmbeddings(
+                    model_name="all-MiniLM-L6-v2",
+                    encode_kwargs={"batch_size": batch_size, "normalize_embeddings": True}
+                )
+                print("Using Sentence Transformers embeddings with all-MiniLM-L6-v2")
+            except Exception as e:
+                print(f"Sentence Transformers not available, using Ollama embeddings: {e}")
+                self.embeddings = OllamaEmbeddings(model="mistral")
+    
+    @property
+    def model_name(self) -> str:
+        """Name of the embedding model, used to key cached embeddings."""
+        return getattr(self.embeddings, "model", None) or getattr(self.embeddings, "model_name", "")
+    
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, reusing cached vectors and embedding only the misses."""
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), vectors))
+            self.embedding_cache.put_many(new_vectors)
+            cached.update(new_vectors)
+        
+        return [cached[key] for key in keys]
+    
+    def _check_dimension(self, stored_dim: Optional[int]) -> bool:
+        """Refuse a persisted store whose vectors don't match the embedding model."""
+        if stored_dim is None:
+            return True
+        
+        expected_dim = len(self.embeddings.embed_query(""))
+        if stored_dim == expected_dim:
+            return True
+        
+        self.load_error = (
+            f"Existing vector store uses {stored_dim}-dimensional embeddings, but "
+            f"{self.model_name} produces {expected_dim}. Clear all data to rebuild it."
+        )
+        print(self.load_error)
+        return False
+    
+    def _append_to_corpus(self, embeddings: List[List[float]], documents: List[Document]) -> None:
+        """Add normalized embeddings and their documents to the corpus matrix."""
+        if not documents or not self._corpus_complete:
+            return
+        
+        # Past the threshold the matrix stops being used, so drop it
+        if len(self._doc_refs) + len(documents) >= self.FAST_SEARCH_MAX_DOCS:
+            self._corpus_complete = False
+            self._corpus = None
+            self._doc_refs = []
+            return
+        
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1.0)
+        
+        # Swap in new objects rather than mutating, so concurrent searches
+        # can work on a snapshot
+        self._doc_refs = self._doc_refs + list(documents)
+        if self._corpus is None:
+            self._corpus = vectors
+        else:
+            self._corpus = np.vstack([self._corpus, vectors])
+    
+    def _reset_corpus(self) -> None:
+        """Drop the in-memory corpus matrix, leaving it empty but complete."""
+        self._corpus = None
+        self._doc_refs = []
+        self._corpus_complete = True
     
+    @synchronized
     def create_vector_store(self, documents: List[Document]) -> None:
         """Create a new vector store from documents."""
         if not documents:
             print("No documents provided to create vector store")
             return
         
-        # Create or update vector store
+        # Append to the persisted collection if there is one; otherwise
+        # start an empty one. Chunks are always added incrementally.
+        if self.vector_store is None:
+            self.load_existing_store()
+        if self.load_error:
+            raise ValueError(self.load_error)
         if self.vector_store is None:
-            self.vector_store = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory=self.persist_directory
+            self.vector_store = Chroma(
+                persist_directory=self.persist_directory,
+                embedding_function=self.embeddings,
+                collection_metadata={"hnsw:space": "cosine"}
+            )
+        
+        # Embed in batches so each embedding call covers many chunks,
+        # then add the precomputed vectors without re-embedding
+        all_embeddings = []
+        stored_documents = []
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            ids = [str(uuid.uuid4()) for _ in batch]
+            texts = [doc.page_content for doc in batch]
+            embeddings = self._embed_documents(texts)
+            self.vector_store._collection.add(
+                ids=ids,
+                embeddings=embeddings,
+                documents=texts,
+                metadatas=[doc.metadata for doc in batch]
+            )
+            all_embeddings.extend(embeddings)
+            stored_documents.extend(
+                Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata)
+                for doc_id, doc in zip(ids, batch)
             )
-        else:
-            # Add documents to existing vector store
-            self.vector_store.add_documents(documents)
         
+        self._append_to_corpus(all_embeddings, stored_documents)
+        self._doc_count += len(documents)
+        self.query_cache.clear()
         print(f"Vector store created with {len(documents)} document chunks")
     
+    @synchronized
     def load_existing_store(self) -> bool:
         """Load existing vector store if it exists."""
+        self.load_error = None
         try:
             if os.path.exists(self.persist_directory):
-                self.vector_store = Chroma(
+                store = Chroma(
                     persist_directory=self.persist_directory,
-                    embedding_function=self.embeddings
+                    embedding_function=self.embeddings,
+                    collection_metadata={"hnsw:space": "cosine"}
                 )
+                sample = store._collection.get(limit=1, include=["embeddings"])["embeddings"]
+                stored_dim = len(sample[0]) if sample is not None and len(sample) else None
+                if not self._check_dimension(stored_dim):
+                    return False
+                
+                self.vector_store = store
+                self._doc_count = self.vector_store._collection.count()
+                self._load_corpus()
                 print("Loaded existing vector store")
                 return True
         except Exception as e:
@@ -54,27 +203,109 @@ class VectorStore:
         
         return False
     
+    def _load_corpus(self) -> None:
+        """Rebuild the corpus matrix from the persisted collection if it is small enough."""
+        self._reset_corpus()
+        if self._doc_count >= self.FAST_SEARCH_MAX_DOCS:
+            self._corpus_complete = False
+            return
+        
+        data = self.vector_store._collection.get(
+            include=["embeddings", "documents", "metadatas"]
+        )
+        documents = [
+            Document(id=doc_id, page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+        ]
+        self._append_to_corpus(data["embeddings"], documents)
+    
     def similarity_search(self, query: str, k: int = 4) -> List[Document]:
         """Search for similar documents."""
         if self.vector_store is None:
             print("Vector store not initialized")
             return []
         
-        return self.vector_store.similarity_search(query, k=k)
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k)
+    
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """Search for documents similar to a query embedding, using the query cache."""
+        if self.vector_store is None:
+            print("Vector store not initialized")
+            return []
+        
+        cached = self.query_cache.get(embedding, k)
+        if cached is not None:
+            return cached
+        
+        documents = self.search_by_vector(embedding, k)
+        self.query_cache.put(embedding, k, documents)
+        return documents
+    
+    def search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """Search by embedding without the query cache."""
+        if self._corpus_complete and len(self._doc_refs) > 0:
+            return self.similarity_search_by_vector_fast(embedding, k=k)
+        
+        return self.vector_store.similarity_search_by_vector(embedding, k=k)
+    
+    def similarity_search_by_vector_fast(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """Search the in-memory corpus matrix by cosine similarity."""
+        doc_refs = self._doc_refs
+        corpus = self._corpus
+        if corpus is None or k <= 0:
+            return []
+        
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query /= norm
+        
+        # Only rows present in both snapshots are searchable
+        scores = corpus[:len(doc_refs)] @ query
+        if k < len(scores):
+            # Partition to the top k, then sort only those
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        
+        return [doc_refs[i] for i in top]
+    
+    def get_document(self, doc_id: str) -> Optional[Document]:
+        """Fetch a single stored document by id."""
+        if self.vector_store is None:
+            return None
+        
+        data = self.vector_store._collection.get(
+            ids=[doc_id], include=["documents", "metadatas"]
+        )
+        if not data["ids"]:
+            return None
+        
+        return Document(
+            id=doc_id,
+            page_content=data["documents"][0],
+            metadata=data["metadatas"][0] or {}
+        )
     
     def get_store_info(self) -> dict:
         """Get information about the vector store."""
+        if self.load_error:
+            return {"status": "error", "count": 0, "error": self.load_error}
         if self.vector_store is None:
             return {"status": "not_initialized", "count": 0}
         
-        try:
-            count = self.vector_store._collection.count()
-            return {"status": "active", "count": count}
-        except Exception as e:
-            return {"status": "error", "count": 0, "error": str(e)}
+        # Maintained on add/load/clear so the sidebar never queries Chroma
+        return {"status": "active", "count": self._doc_count}
     
+    @synchronized
     def clear_store(self) -> None:
         """Clear the vector store."""
+        self.query_cache.clear()
+        self.embedding_cache.clear()
+        self._reset_corpus()
+        self._doc_count = 0
+        self.load_error = None
         if self.vector_store is not None:
             try:
                 self.vector_store.delete_collection()